@@ -38,21 +38,47 @@ License: MIT
 
 import os
 import time
-import json
+import logging
 import asyncio
-import secrets
+import base64
+import hashlib
+import heapq
+import signal
 import jwt
 import datetime
-from typing import Dict, Any, Optional
+import functools
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import Annotated, Dict, Any, Iterable, List, Mapping, Optional, Tuple, Union
 from urllib.parse import urlencode
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, RedirectResponse, HTMLResponse
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import Depends, FastAPI, Form, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, RedirectResponse, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.staticfiles import StaticFiles
+from markupsafe import Markup
+from pydantic import BaseModel, Field, ValidationError
+from minijinja import Environment
 from dotenv import load_dotenv
+import orjson
+from cachetools import TTLCache
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
 import httpx
+import redis.asyncio as aioredis
 
 load_dotenv()
 
+# Logging (per-request detail is DEBUG, so production runs at WARNING by default)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger("broker.auth")
+logger.setLevel(LOG_LEVEL)
+
 # Okta OIDC Configuration (Required)
 OKTA_DOMAIN = os.getenv("OKTA_DOMAIN")
 OKTA_CLIENT_ID = os.getenv("OKTA_CLIENT_ID") 
@@ -60,14 +86,320 @@ OKTA_CLIENT_SECRET = os.getenv("OKTA_CLIENT_SECRET")
 OKTA_AUTH_SERVER_ID = os.getenv("OKTA_AUTH_SERVER_ID", "default")
 OKTA_REDIRECT_URI = os.getenv("OKTA_REDIRECT_URI", "http://localhost:8081/auth/callback")
 
+# Okta endpoints (built once from the configuration above)
+OKTA_ISSUER = f"https://{OKTA_DOMAIN}/oauth2/{OKTA_AUTH_SERVER_ID}"
+OKTA_AUTHORIZE_URL = f"{OKTA_ISSUER}/v1/authorize"
+OKTA_TOKEN_URL = f"{OKTA_ISSUER}/v1/token"
+OKTA_USERINFO_URL = f"{OKTA_ISSUER}/v1/userinfo"
+OKTA_JWKS_URL = f"{OKTA_ISSUER}/v1/keys"
+
+# Request-independent part of the PKCE authorization query string
+_PKCE_AUTHORIZE_QUERY = urlencode({
+    "client_id": OKTA_CLIENT_ID,
+    "response_type": "code",
+    "scope": "openid profile email groups",
+    "redirect_uri": OKTA_REDIRECT_URI,
+    "code_challenge_method": "S256",
+})
+
 # Vault Configuration
-VAULT_ADDR = "http://vault:8200"  # Fixed to use Docker service name
+# Defaults to the Docker service name. Deliberately not read from VAULT_ADDR: .env sets
+# that to the host-side CLI address (http://localhost:8200), and env_file passes it into
+# the container too, where localhost is not Vault
+VAULT_ADDR = os.getenv("BROKER_VAULT_ADDR", "http://vault:8200")
 VAULT_ROOT_TOKEN = os.getenv("VAULT_ROOT_TOKEN")
+VAULT_JWT_LOGIN_PATH = "/v1/auth/jwt/login"
+VAULT_LOOKUP_SELF_PATH = "/v1/auth/token/lookup-self"
+
+# Size of the worker thread pool used for sync dependencies/handlers (anyio default: 40)
+BROKER_THREADS = int(os.getenv("BROKER_THREADS", "64"))
+
+# Okta group → team mapping (team name doubles as the Vault JWT role name)
+_TEAM_MAPPING: Mapping[str, str] = MappingProxyType({
+    "mobile-developers": "mobile-team",
+    "backend-developers": "backend-team",
+    "frontend-developers": "frontend-team",
+    "devops-team": "devops-team",
+})
+
+# Team → Vault token role used for child token creation
+_TEAM_TOKEN_ROLES: Mapping[str, str] = MappingProxyType({
+    "mobile-team": "mobile-team-token",
+    "backend-team": "backend-team-token",
+    "frontend-team": "frontend-team-token",
+    "devops-team": "devops-team-token",
+    "base-team": "base-team-token",
+})
+
+# Team → Vault token create path (built once; unknown teams use the base-team role)
+_TOKEN_CREATE_PATHS: Mapping[str, str] = MappingProxyType({
+    team: f"/v1/auth/token/create/{role}" for team, role in _TEAM_TOKEN_ROLES.items()
+})
+_DEFAULT_TOKEN_CREATE_PATH = _TOKEN_CREATE_PATHS["base-team"]
+
+# Request-independent fields of every child token create call; policies are not
+# listed so the child inherits them from the parent token
+CHILD_TOKEN_NUM_USES = 10
+_CHILD_TOKEN_REQUEST_BASE: Mapping[str, Any] = MappingProxyType({
+    "ttl": "2h",
+    "num_uses": CHILD_TOKEN_NUM_USES,
+    "renewable": False,
+})
+
+# Broker JWT signing configuration
+JWT_SIGNING_KEY_PATH = "/app/jwt_signing_key"
+JWT_FALLBACK_SECRET = "bazel-demo-jwt-signing-key-2024"
+
+# Browser result pages. Everything outside a page's {# page-body #} block (head,
+# asset links, closing markup) is request-invariant, so it is encoded to bytes once
+# at import and only the body is rendered per request by MiniJinja's native engine.
+# CSS/JS live in broker/static and are served with immutable caching.
+_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+AUTH_SUCCESS_TMPL = "auth_success.html"
+SELECT_TEAM_TMPL = "select_team.html"
+TEAM_OPTIONS_TMPL = "team_options.html"
+
+def _read_template(name: str) -> str:
+    with open(os.path.join(_TEMPLATE_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def _split_page(name: str) -> Tuple[str, str, str]:
+    """Read a page template and split it into its static head, template body and static tail"""
+    head, _, rest = _read_template(name).partition("{# page-body #}\n")
+    body, _, tail = rest.partition("{# /page-body #}\n")
+    return head, body, tail
+
+@functools.lru_cache(maxsize=None)
+def static_url(filename: str) -> str:
+    """URL of a file under /static, versioned by content hash so it can be cached as immutable"""
+    with open(os.path.join(_STATIC_DIR, filename), "rb") as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"/static/{filename}?v={version}"
+
+_templates = Environment(
+    templates={TEAM_OPTIONS_TMPL: _read_template(TEAM_OPTIONS_TMPL)},
+    globals={"static_url": static_url},
+    # Escape every interpolated value in .html templates; MiniJinja uses markupsafe's C escape
+    auto_escape_callback=lambda name: name.endswith(".html"),
+    keep_trailing_newline=True,
+    debug=False,
+)
+
+# Shells are rendered once here (only static_url() links in them); bodies are
+# registered as templates and rendered per request
+_PAGE_SHELLS: Dict[str, Tuple[bytes, bytes]] = {}
+for _name in (AUTH_SUCCESS_TMPL, SELECT_TEAM_TMPL):
+    _head, _body, _tail = _split_page(_name)
+    _templates.add_template(_name, _body)
+    _PAGE_SHELLS[_name] = (
+        _templates.render_str(_head).encode("utf-8"),
+        _templates.render_str(_tail).encode("utf-8"),
+    )
+
+class ImmutableStaticFiles(StaticFiles):
+    """StaticFiles that lets browsers cache forever; static_url() changes the URL when content changes"""
+    
+    def file_response(self, *args: Any, **kwargs: Any) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+def render_page(name: str, **context: Any) -> Response:
+    """
+    Render a page's dynamic body between the prebuilt static head/tail bytes.
+    
+    Only the body is rendered per request; the page goes out as one buffered
+    body so GZipMiddleware can compress it in a single pass and the response
+    keeps its Content-Length. Template errors surface as normal HTTP errors.
+    """
+    head, tail = _PAGE_SHELLS[name]
+    body = _templates.render_template(name, **context).encode("utf-8")
+    return Response(b"".join((head, body, tail)), media_type="text/html")
+
+@functools.lru_cache(maxsize=128)
+def _render_team_options(available_teams: Tuple[str, ...]) -> Markup:
+    """
+    Radio buttons for the team selection form, rendered once per distinct team set.
+    
+    Team sets come from the fixed Okta group mapping (always in mapping order),
+    so only a handful of variants ever exist.
+    """
+    return Markup(_templates.render_template(TEAM_OPTIONS_TMPL, available_teams=available_teams))
+
+def _render_auth_success(session_id: str, user_info: Dict[str, Any], extra_info_html: Markup) -> Response:
+    """
+    Success page shared by the single-team callback and the team-selection completion.
+    
+    extra_info_html is inserted verbatim, so build it with Markup.format(),
+    which escapes the interpolated values.
+    """
+    return render_page(AUTH_SUCCESS_TMPL, session_id=session_id, user_info=user_info, extra_info_html=extra_info_html)
+
+@dataclass(slots=True)
+class UserSession:
+    """Authenticated broker session that can be exchanged for child tokens"""
+    vault_token: str
+    user_info: Dict[str, Any]
+    selected_team: str
+    id_token: str
+    access_token: str
+    expires_at: float
+    auth_method: str
+
+@dataclass(slots=True)
+class TeamSelectionSession:
+    """Short-lived session for a user who still has to pick a team context"""
+    user_info: Dict[str, Any]
+    available_teams: Tuple[str, ...]
+    id_token: str
+    access_token: str
+    expires_at: float
+    auth_method: str
+    is_cli_request: bool
+    state: str
+    
+    def __post_init__(self):
+        # Sessions loaded back from Redis carry a JSON list here
+        self.available_teams = tuple(self.available_teams)
+
+class ExchangeRequest(BaseModel):
+    """Body of POST /exchange: the broker session plus Bazel context recorded on the child token"""
+    session_id: str = Field(min_length=1)
+    pipeline: str = "unknown"
+    repo: str = "unknown"
+    target: str = "unknown"
+
+class TeamSelectionForm(BaseModel):
+    """Form body of POST /auth/select-team (missing fields fall through to the handler's 400s)"""
+    temp_session_id: str = ""
+    selected_team: str = ""
+
+@dataclass(slots=True)
+class PkceSession:
+    """PKCE verifier kept between the authorize redirect and the callback"""
+    code_verifier: str
+    created_at: float
+    is_cli: bool
+
+# Global user sessions storage: process-local by default, shared Redis when REDIS_URL is set
+REDIS_URL = os.getenv("REDIS_URL")
+_user_sessions: Dict[str, Union[UserSession, TeamSelectionSession]] = {}
+_SESSION_KEY_PREFIX: Mapping[type, str] = MappingProxyType({
+    UserSession: "session:",
+    TeamSelectionSession: "team-selection:",
+})
+
+# Shapes of the session ids the broker issues ("<prefix>_" + random_token()), so
+# malformed ids from scanners or misconfigured clients are rejected before any
+# store or Redis lookup
+_SESSION_ID_PREFIXES: Mapping[type, Tuple[str, ...]] = MappingProxyType({
+    UserSession: ("session_", "cli_session_"),
+    TeamSelectionSession: ("temp_",),
+})
+_SESSION_ID_MAX_LEN = 64
+
+# Okta userinfo cache keyed by a hash of the access token (raw tokens are never stored)
+USERINFO_CACHE_TTL = int(os.getenv("USERINFO_CACHE_TTL", "60"))
+_userinfo_cache: TTLCache = TTLCache(maxsize=10_000, ttl=USERINFO_CACHE_TTL)
+_userinfo_inflight: Dict[bytes, asyncio.Task] = {}
+
+# Pending PKCE authorizations keyed by OAuth state (in Redis next to the sessions
+# when REDIS_URL is set, so the callback may land on any worker)
+PKCE_SESSION_TTL = 600  # 10 minutes to complete the Okta login
+_PKCE_KEY_PREFIX = "pkce:"
+_PKCE_SESSIONS: Dict[str, PkceSession] = {}
+_pkce_exchange_inflight: Dict[str, asyncio.Task] = {}
+
+# Recently minted child tokens keyed by (session_id, pipeline, repo, target, team), so
+# retried/duplicate /exchange calls from one Bazel build reuse a token instead of minting
+# another. Vault counts a token's uses by whoever holds it, so the broker cannot know how
+# many are left on a reused token: hits are marked shared and carry no uses_remaining.
+CHILD_TOKEN_CACHE_TTL = int(os.getenv("CHILD_TOKEN_CACHE_TTL", "30"))
+_child_token_cache: TTLCache = TTLCache(maxsize=5_000, ttl=CHILD_TOKEN_CACHE_TTL)
+
+# Successful parent token validations keyed by a hash of the token, so repeated
+# /exchange calls skip the lookup-self round-trip. A revoked parent still fails at
+# child token creation, which authenticates with the parent token itself.
+PARENT_TOKEN_CACHE_TTL = int(os.getenv("PARENT_TOKEN_CACHE_TTL", "60"))
+_parent_token_cache: TTLCache = TTLCache(maxsize=5_000, ttl=PARENT_TOKEN_CACHE_TTL)
+
+# Min-heap of (expires_at, store kind, key) drained by _reap_expired_sessions()
+_EXPIRY_STORES: Dict[str, Dict[str, Any]] = {"session": _user_sessions, "pkce": _PKCE_SESSIONS}
+_expiry_heap: List[Tuple[float, str, str]] = []
+_expiry_wakeup = asyncio.Event()
+CACHE_SWEEP_INTERVAL = 60  # seconds between TTLCache purges when no session is due
+
+_urandom = os.urandom
+_b64 = base64.urlsafe_b64encode
+
+def random_token() -> str:
+    """128-bit URL-safe random string (same format as secrets.token_urlsafe(16), minus the wrapper)"""
+    return _b64(_urandom(16)).rstrip(b"=").decode("ascii")
 
-app = FastAPI(title="Bazel JWT Vault Demo - Okta OIDC", version="2.0.0")
+def _schedule_expiry(kind: str, key: str, expires_at: float) -> None:
+    """Register a store entry with the reaper, waking it if this is the new earliest deadline"""
+    heapq.heappush(_expiry_heap, (expires_at, kind, key))
+    if _expiry_heap[0][0] == expires_at:
+        _expiry_wakeup.set()
 
-# Global user sessions storage
-_user_sessions: Dict[str, Dict[str, Any]] = {}
+async def store_session(session_id: str, session: Union[UserSession, TeamSelectionSession], now: Optional[float] = None) -> None:
+    """Save a user or team-selection session and schedule its eviction (now: the caller's clock reading)"""
+    redis = app.state.redis
+    if redis is not None:
+        # Redis expires the key itself, so workers share sessions and nothing is reaped locally
+        ttl = max(1, int(session.expires_at - (time.time() if now is None else now)))
+        await redis.set(_SESSION_KEY_PREFIX[type(session)] + session_id, orjson.dumps(session), ex=ttl)
+        return
+    
+    _user_sessions[session_id] = session
+    _schedule_expiry("session", session_id, session.expires_at)
+
+async def load_session(session_id: str, session_type: type, now: Optional[float] = None) -> Optional[Union[UserSession, TeamSelectionSession]]:
+    """Return the live session of the given type, or None if it is unknown, expired or of another type"""
+    if (
+        len(session_id) > _SESSION_ID_MAX_LEN
+        or not session_id.startswith(_SESSION_ID_PREFIXES[session_type])
+        or not session_id.isascii()
+    ):
+        return None
+    
+    redis = app.state.redis
+    if redis is not None:
+        raw = await redis.get(_SESSION_KEY_PREFIX[session_type] + session_id)
+        return session_type(**orjson.loads(raw)) if raw is not None else None
+    
+    session = _user_sessions.get(session_id)
+    if isinstance(session, session_type) and (time.time() if now is None else now) <= session.expires_at:
+        return session
+    return None
+
+async def drop_session(session_id: str, session_type: type) -> None:
+    """Forget a session (its pending reaper entry becomes a no-op)"""
+    redis = app.state.redis
+    if redis is not None:
+        await redis.delete(_SESSION_KEY_PREFIX[session_type] + session_id)
+    else:
+        _user_sessions.pop(session_id, None)
+
+async def store_pkce_session(state: str, pkce: PkceSession) -> None:
+    """Save a pending PKCE login and schedule its eviction"""
+    redis = app.state.redis
+    if redis is not None:
+        await redis.set(_PKCE_KEY_PREFIX + state, orjson.dumps(pkce), ex=PKCE_SESSION_TTL)
+        return
+    
+    _PKCE_SESSIONS[state] = pkce
+    _schedule_expiry("pkce", state, pkce.created_at + PKCE_SESSION_TTL)
+
+async def take_pkce_session(state: str) -> Optional[PkceSession]:
+    """Remove and return a pending PKCE login in one step, so a state can only be used once"""
+    redis = app.state.redis
+    if redis is not None:
+        raw = await redis.getdel(_PKCE_KEY_PREFIX + state)
+        return PkceSession(**orjson.loads(raw)) if raw is not None else None
+    
+    return _PKCE_SESSIONS.pop(state, None)
 
 def validate_okta_config():
     """Validate that required Okta configuration is present"""
@@ -80,52 +412,65 @@ def validate_okta_config():
     if not OKTA_AUTH_SERVER_ID:
         raise ValueError("OKTA_AUTH_SERVER_ID environment variable is required")
 
-async def validate_parent_token(token: str) -> Dict[str, Any]:
+async def validate_parent_token(vault: httpx.AsyncClient, token: str, now: Optional[float] = None) -> Dict[str, Any]:
     """
     Validate that the parent token has the expected role-based constraints.
     
     This ensures we're working with a properly authenticated JWT token
     that has team-specific policies rather than overly broad permissions.
+    
+    Successful validations are cached for PARENT_TOKEN_CACHE_TTL seconds, or
+    until the token's own TTL runs out if that comes first.
     """
-    async with httpx.AsyncClient() as client:
-        # Get token self-information
-        token_info_response = await client.get(
-            f"{VAULT_ADDR}/v1/auth/token/lookup-self",
-            headers={"X-Vault-Token": token}
+    if now is None:
+        now = time.time()
+    key = hashlib.sha256(token.encode()).digest()[:16]
+    cached = _parent_token_cache.get(key)
+    if cached is not None:
+        token_data, expires_at = cached
+        if now < expires_at:
+            return token_data
+        del _parent_token_cache[key]
+    
+    # Get token self-information
+    token_info_response = await vault.get(
+        VAULT_LOOKUP_SELF_PATH,
+        headers={"X-Vault-Token": token}
+    )
+    
+    if token_info_response.status_code != 200:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid parent token or token lookup failed"
         )
-        
-        if token_info_response.status_code != 200:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid parent token or token lookup failed"
-            )
-        
-        token_data = token_info_response.json()["data"]
-        
-        # Validate token has expected constraints
-        policies = token_data.get("policies", [])
-        meta = token_data.get("meta", {})
-        token_type = token_data.get("type", "unknown")
-        
-        # Ensure the token was created through JWT auth (not direct token creation)
-        if not any(policy.startswith("bazel-") for policy in policies):
-            raise HTTPException(
-                status_code=403,
-                detail="Parent token lacks required team-based policies"
-            )
-        
-        # Verify this is a proper service token (not batch token)
-        if token_type != "service":
-            raise HTTPException(
-                status_code=403,
-                detail=f"Invalid parent token type: {token_type}. Expected service token."
-            )
-        
-        print(f"✓ Parent token validated with policies: {policies}")
-        print(f"  Token metadata: {meta}")
-        print(f"  Token type: {token_type}")
-        
-        return token_data
+    
+    token_data = orjson.loads(token_info_response.content)["data"]
+    
+    # Validate token has expected constraints
+    policies = token_data.get("policies", [])
+    meta = token_data.get("meta", {})
+    token_type = token_data.get("type", "unknown")
+    
+    # Ensure the token was created through JWT auth (not direct token creation)
+    if not any(policy.startswith("bazel-") for policy in policies):
+        raise HTTPException(
+            status_code=403,
+            detail="Parent token lacks required team-based policies"
+        )
+    
+    # Verify this is a proper service token (not batch token)
+    if token_type != "service":
+        raise HTTPException(
+            status_code=403,
+            detail=f"Invalid parent token type: {token_type}. Expected service token."
+        )
+    
+    logger.debug("Parent token validated: policies=%s type=%s meta=%s", policies, token_type, meta)
+    
+    # A ttl of 0 means the token never expires
+    token_ttl = token_data.get("ttl") or PARENT_TOKEN_CACHE_TTL
+    _parent_token_cache[key] = (token_data, now + min(token_ttl, PARENT_TOKEN_CACHE_TTL))
+    return token_data
 
 def get_okta_auth_url(state: str) -> str:
     """Generate Okta authorization URL for OIDC flow"""
@@ -136,7 +481,12 @@ def get_okta_auth_url(state: str) -> str:
         "redirect_uri": OKTA_REDIRECT_URI,
         "state": state,
     }
-    return f"https://{OKTA_DOMAIN}/oauth2/{OKTA_AUTH_SERVER_ID}/v1/authorize?{urlencode(params)}"
+    return f"{OKTA_AUTHORIZE_URL}?{urlencode(params)}"
+
+def get_pkce_auth_url(state: str, code_challenge: str) -> str:
+    """Generate Okta authorization URL for the PKCE flow (browser and CLI)"""
+    dynamic = urlencode({"state": state, "code_challenge": code_challenge})
+    return f"{OKTA_AUTHORIZE_URL}?{_PKCE_AUTHORIZE_QUERY}&{dynamic}"
 
 async def exchange_code_for_token(code: str) -> Dict[str, Any]:
     """
@@ -152,39 +502,41 @@ async def exchange_code_for_token(code: str) -> Dict[str, Any]:
         HTTPException: If token exchange fails with Okta
     """
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            token_url = f"https://{OKTA_DOMAIN}/oauth2/{OKTA_AUTH_SERVER_ID}/v1/token"
-            print(f" Attempting token exchange at: {token_url}")
-            
-            token_response = await client.post(
-                token_url,
-                data={
-                    "grant_type": "authorization_code",
-                    "client_id": OKTA_CLIENT_ID,
-                    "client_secret": OKTA_CLIENT_SECRET,
-                    "code": code,
-                    "redirect_uri": OKTA_REDIRECT_URI,
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
+        client = app.state.http
+        logger.debug("Attempting token exchange at: %s", OKTA_TOKEN_URL)
+        
+        token_response = await client.post(
+            OKTA_TOKEN_URL,
+            data={
+                "grant_type": "authorization_code",
+                "client_id": OKTA_CLIENT_ID,
+                "client_secret": OKTA_CLIENT_SECRET,
+                "code": code,
+                "redirect_uri": OKTA_REDIRECT_URI,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        
+        logger.debug("Token response status: %s", token_response.status_code)
+        if token_response.status_code != 200:
+            logger.warning("Token exchange failed: %s", token_response.text)
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Token exchange failed: {token_response.text}"
             )
-            
-            print(f"📡 Token response status: {token_response.status_code}")
-            if token_response.status_code != 200:
-                print(f" Token exchange failed: {token_response.text}")
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Token exchange failed: {token_response.text}"
-                )
-            
-            return token_response.json()
+        
+        return orjson.loads(token_response.content)
     except Exception as e:
-        print(f" Exception in token exchange: {e}")
+        logger.warning("Exception in token exchange: %s", e)
         raise
 
 async def get_user_info(access_token: str) -> Dict[str, Any]:
     """
     Retrieve user information from Okta using access token.
     
+    Responses are cached for USERINFO_CACHE_TTL seconds, and concurrent lookups
+    for the same token share a single request to Okta.
+    
     Args:
         access_token: OAuth 2.0 access token from Okta
         
@@ -194,87 +546,270 @@ async def get_user_info(access_token: str) -> Dict[str, Any]:
     Raises:
         HTTPException: If user info retrieval fails
     """
+    key = hashlib.sha256(access_token.encode()).digest()[:16]
+    
+    cached = _userinfo_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    task = _userinfo_inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_user_info(access_token))
+        _userinfo_inflight[key] = task
+        task.add_done_callback(lambda _: _userinfo_inflight.pop(key, None))
+    
+    user_data = await asyncio.shield(task)
+    _userinfo_cache[key] = user_data
+    return user_data
+
+async def _fetch_user_info(access_token: str) -> Dict[str, Any]:
+    """Fetch user information from the Okta userinfo endpoint"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            userinfo_url = f"https://{OKTA_DOMAIN}/oauth2/{OKTA_AUTH_SERVER_ID}/v1/userinfo"
-            print(f" Getting user info from: {userinfo_url}")
-            
-            userinfo_response = await client.get(
-                userinfo_url,
-                headers={"Authorization": f"Bearer {access_token}"}
+        client = app.state.http
+        logger.debug("Getting user info from: %s", OKTA_USERINFO_URL)
+        
+        userinfo_response = await client.get(
+            OKTA_USERINFO_URL,
+            headers={"Authorization": f"Bearer {access_token}"}
+        )
+        
+        logger.debug("User info response status: %s", userinfo_response.status_code)
+        if userinfo_response.status_code != 200:
+            logger.warning("User info failed: %s", userinfo_response.text)
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to get user info: {userinfo_response.text}"
             )
-            
-            print(f" User info response status: {userinfo_response.status_code}")
-            if userinfo_response.status_code != 200:
-                print(f" User info failed: {userinfo_response.text}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Failed to get user info: {userinfo_response.text}"
-                )
-            
-            user_data = userinfo_response.json()
-            print(f" User info retrieved for: {user_data.get('email', 'unknown')}")
-            return user_data
+        
+        user_data = orjson.loads(userinfo_response.content)
+        logger.debug("User info retrieved for: %s", user_data.get("email", "unknown"))
+        return user_data
     except Exception as e:
-        print(f" Exception in get_user_info: {e}")
+        logger.warning("Exception in get_user_info: %s", e)
         raise
 
-def determine_vault_role_from_okta_groups(okta_groups: list) -> str:
-    """Map Okta groups to Vault OIDC roles for team-specific access"""
-    role_mapping = {
-        "mobile-developers": "mobile-team",
-        "backend-developers": "backend-team", 
-        "frontend-developers": "frontend-team",
-        "devops-team": "devops-team",
-    }
+@dataclass(frozen=True, slots=True)
+class TeamResolution:
+    """Team context derived from a user's Okta groups"""
+    team: str                         # Default team (first match)
+    vault_role: str                   # Vault JWT role for the default team
+    available_teams: Tuple[str, ...]  # Every team the user can select
+
+def resolve_teams(okta_groups: Iterable[str]) -> TeamResolution:
+    """
+    Map Okta groups to teams and Vault roles in a single pass.
     
-    # Find the first matching group and return corresponding role
-    for group in okta_groups:
-        if group in role_mapping:
-            return role_mapping[group]
-    
-    # Default to base role if no specific team match
-    return "base-team"
-
-def determine_team_from_okta_groups(okta_groups: list) -> str:
-    """Determine team name from Okta groups for entity creation"""
-    team_mapping = {
-        "mobile-developers": "mobile-team",
-        "backend-developers": "backend-team",
-        "frontend-developers": "frontend-team", 
-        "devops-team": "devops-team",
-    }
+    Walks the small group → team mapping (rather than the user's possibly long
+    group list) and falls back to base-team when no group matches. The team
+    name doubles as the Vault JWT role name.
+    """
+    group_set = set(okta_groups)
+    available_teams = tuple(team for group, team in _TEAM_MAPPING.items() if group in group_set)
+    if not available_teams:
+        available_teams = ("base-team",)
     
-    # Find the first matching group and return team name
-    for group in okta_groups:
-        if group in team_mapping:
-            return team_mapping[group]
-    
-    # Default team for users without specific team groups
-    return "base-team"
-
-def determine_available_teams_from_groups(okta_groups: list) -> list:
-    """Determine all available teams from Okta groups for user context selection"""
-    team_mapping = {
-        "mobile-developers": "mobile-team",
-        "backend-developers": "backend-team", 
-        "frontend-developers": "frontend-team",
-        "devops-team": "devops-team",
-    }
+    default_team = available_teams[0]
+    return TeamResolution(default_team, default_team, available_teams)
+
+def _load_signing_key():
+    """
+    Load and parse the Ed25519 or RSA private key used to sign team-based JWTs.
     
-    # Find all matching teams
-    available_teams = []
-    for group in okta_groups:
-        if group in team_mapping:
-            team = team_mapping[group]
-            if team not in available_teams:
-                available_teams.append(team)
+    Falls back to the shared development secret (HS256) when no key file is
+    present, the PEM cannot be parsed, or it holds another kind of key.
+    """
+    try:
+        key = serialization.load_pem_private_key(Path(JWT_SIGNING_KEY_PATH).read_bytes(), password=None)
+        if isinstance(key, (ed25519.Ed25519PrivateKey, rsa.RSAPrivateKey)):
+            return key
+        logger.warning("Unsupported key type in %s, using fallback signing key: %s", JWT_SIGNING_KEY_PATH, type(key).__name__)
+    except FileNotFoundError:
+        logger.warning("Using fallback signing key - generate jwt_signing_key for production")
+    except OSError as e:
+        logger.warning("Could not read %s, using fallback signing key: %s", JWT_SIGNING_KEY_PATH, e)
+    except ValueError as e:
+        logger.warning("Could not parse %s, using fallback signing key: %s", JWT_SIGNING_KEY_PATH, e)
+    return JWT_FALLBACK_SECRET
+
+def _signing_algorithm(signing_key: Union[Any, str]) -> str:
+    """JWS algorithm for a signing key: EdDSA for Ed25519, RS256 for RSA, HS256 for the fallback secret"""
+    if isinstance(signing_key, str):
+        return "HS256"
+    return "EdDSA" if isinstance(signing_key, ed25519.Ed25519PrivateKey) else "RS256"
+
+# (key, algorithm) parsed once during startup so JWT issuance skips file I/O and PEM
+# decoding. Published as one tuple so a SIGHUP reload can never pair one key with the
+# other's algorithm for a token being signed in a worker thread.
+_SIGNER: Tuple[Union[Any, str, None], str] = (None, "HS256")
+
+def _build_jwks(signing_key: Union[Any, str]) -> bytes:
+    """
+    Serialize the broker's public JWKS (empty when signing with the HS256 fallback).
     
-    # Always include base-team as fallback
-    if not available_teams:
-        available_teams.append("base-team")
+    The kid is the RFC 7638 thumbprint of the public key (over its required
+    members: crv/kty/x for Ed25519, e/kty/n for RSA).
+    """
+    algorithm = _signing_algorithm(signing_key)
+    if algorithm == "HS256":
+        return orjson.dumps({"keys": []})
+    
+    if algorithm == "EdDSA":
+        jwk = jwt.algorithms.OKPAlgorithm.to_jwk(signing_key.public_key(), as_dict=True)
+        required = ("crv", "kty", "x")
+    else:
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(signing_key.public_key(), as_dict=True)
+        required = ("e", "kty", "n")
+    thumbprint = hashlib.sha256(orjson.dumps({m: jwk[m] for m in required})).digest()
+    jwk.update(kid=_b64(thumbprint).rstrip(b"=").decode("ascii"), use="sig", alg=algorithm)
+    return orjson.dumps({"keys": [jwk]})
+
+def _etag(body: bytes) -> str:
+    """Strong ETag derived from a response body"""
+    return f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check using weak comparison (RFC 9110 13.1.2): W/ is ignored and * matches"""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+# Serialized once when the signing key is loaded; served with a content-hash ETag
+_JWKS_BODY: bytes = _build_jwks(JWT_FALLBACK_SECRET)
+_JWKS_ETAG: str = _etag(_JWKS_BODY)
+
+# Okta signing keys by kid, imported once when the JWKS is fetched so id_token
+# verification is a dict lookup into already-parsed key objects. The dict is
+# replaced wholesale on refresh, never mutated in place.
+_okta_keys: Dict[str, jwt.PyJWK] = {}
+
+async def _fetch_okta_jwks() -> Dict[str, Any]:
+    """Fetch Okta's JSON Web Key Set over the shared client (also warms its connection)"""
+    response = await app.state.http.get(OKTA_JWKS_URL)
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+def _import_okta_keys(jwks: Dict[str, Any]) -> Dict[str, jwt.PyJWK]:
+    """Parse every usable key in a JWKS into a kid → PyJWK map"""
+    keys = {}
+    for jwk in jwks.get("keys", []):
+        kid = jwk.get("kid")
+        if not kid:
+            continue
+        try:
+            keys[kid] = jwt.PyJWK(jwk)
+        except (jwt.PyJWKError, jwt.InvalidKeyError) as e:
+            logger.warning("Skipping unusable Okta JWK %s: %s", kid, e)
+    return keys
+
+# id_token claim checks, configured once: the standard claims Okta always issues
+# are essential, and a little clock skew between Okta and the broker is tolerated
+_ID_TOKEN_DECODE_OPTIONS = {"require": ["iss", "aud", "exp", "iat"]}
+ID_TOKEN_LEEWAY = 30  # seconds
+
+# base64url padding indexed by segment length mod 4 (1 is never valid)
+_B64_PAD = ("", "===", "==", "=")
+
+def _jwt_header(token: str) -> Dict[str, Any]:
+    """
+    Decode a compact JWT's header segment without PyJWT's full token split/validation.
+    
+    The three-segment shape is checked by counting dots (one C-level scan)
+    before anything is decoded, and only the header substring is allocated.
+    """
+    if token.count(".") != 2:
+        raise jwt.DecodeError("Invalid token header: expected three segments")
+    try:
+        segment = token[:token.index(".")]
+        header = orjson.loads(base64.urlsafe_b64decode(segment + _B64_PAD[len(segment) & 3]))
+    except ValueError as e:
+        raise jwt.DecodeError(f"Invalid token header: {e}") from e
+    if not isinstance(header, dict):
+        raise jwt.DecodeError("Invalid token header")
+    return header
+
+async def _read_id_token_claims(id_token: str) -> Dict[str, Any]:
+    """
+    Decode an Okta ID token, verifying it against the cached signing keys.
+    
+    An unknown kid triggers one JWKS refetch (Okta rotated its keys). If the
+    keys still cannot be had, the claims are read unverified as before: the
+    token came straight from Okta's token endpoint over TLS.
+    """
+    global _okta_keys
+    
+    kid = _jwt_header(id_token).get("kid")
+    key = _okta_keys.get(kid)
+    if key is None and kid:
+        try:
+            _okta_keys = _import_okta_keys(await _fetch_okta_jwks())
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
+            logger.warning("Could not refresh Okta JWKS from %s: %s", OKTA_JWKS_URL, e)
+        key = _okta_keys.get(kid)
+    
+    if key is None:
+        return jwt.decode(id_token, options={"verify_signature": False})
+    return jwt.decode(
+        id_token,
+        key,
+        algorithms=[key.algorithm_name],
+        audience=OKTA_CLIENT_ID,
+        issuer=OKTA_ISSUER,
+        leeway=ID_TOKEN_LEEWAY,
+        options=_ID_TOKEN_DECODE_OPTIONS,
+    )
+
+def _install_signing_key(signing_key: Union[Any, str]) -> None:
+    """Make a parsed signing key current and republish the JWKS built from it"""
+    global _SIGNER, _JWKS_BODY, _JWKS_ETAG
+    
+    _SIGNER = (signing_key, _signing_algorithm(signing_key))
+    _JWKS_BODY = _build_jwks(signing_key)
+    _JWKS_ETAG = _etag(_JWKS_BODY)
+
+async def _reload_signing_key() -> None:
+    """Re-read the signing key file in a worker thread (on SIGHUP), keeping the loop free"""
+    signing_key = await asyncio.to_thread(_load_signing_key)
+    if isinstance(signing_key, str):
+        # An unreadable or broken file must not downgrade a running broker to the fallback
+        # secret; _load_signing_key() has already logged why the file was rejected
+        if isinstance(_SIGNER[0], str):
+            logger.warning("Still signing with the fallback secret; no usable key at %s", JWT_SIGNING_KEY_PATH)
+        else:
+            logger.warning("Keeping the current JWT signing key; reload from %s failed", JWT_SIGNING_KEY_PATH)
+        return
+    _install_signing_key(signing_key)
+    logger.info("Reloaded JWT signing key from %s", JWT_SIGNING_KEY_PATH)
+
+async def _warm_up():
+    """
+    Prepare everything the first login needs before traffic arrives.
+    
+    The signing key is parsed in a worker thread while Okta's JWKS is fetched
+    and Vault is pinged, so startup pays for the slowest of the three rather
+    than their sum, and both connection pools are already open for the first
+    user. Backend failures are logged, not fatal: the broker still starts and
+    requests connect lazily as before.
+    """
+    global _okta_keys
+    
+    signing_key, jwks, vault_health = await asyncio.gather(
+        asyncio.to_thread(_load_signing_key),
+        _fetch_okta_jwks(),
+        app.state.vault.get("/v1/sys/health"),
+        return_exceptions=True,
+    )
+    
+    _install_signing_key(JWT_FALLBACK_SECRET if isinstance(signing_key, BaseException) else signing_key)
     
-    return available_teams
+    if isinstance(jwks, BaseException):
+        logger.warning("Could not prefetch Okta JWKS from %s: %s", OKTA_JWKS_URL, jwks)
+    else:
+        _okta_keys = _import_okta_keys(jwks)
+    
+    if isinstance(vault_health, BaseException):
+        logger.warning("Vault not reachable at %s during warm-up: %s", VAULT_ADDR, vault_health)
 
 def generate_team_based_jwt(user_info: Dict[str, Any], team: str) -> str:
     """
@@ -290,14 +825,7 @@ def generate_team_based_jwt(user_info: Dict[str, Any], team: str) -> str:
     Returns:
         Signed JWT token with team as subject
     """
-    # Load the RSA private key for signing
-    try:
-        with open("/app/jwt_signing_key", "r") as f:
-            private_key = f.read()
-    except FileNotFoundError:
-        # Fallback to a simple key for development
-        private_key = "bazel-demo-jwt-signing-key-2024"
-        print("  Using fallback signing key - generate jwt_signing_key for production")
+    private_key, algorithm = _SIGNER
     
     # Current time
     now = datetime.datetime.utcnow()
@@ -315,17 +843,17 @@ def generate_team_based_jwt(user_info: Dict[str, Any], team: str) -> str:
         "team": team
     }
     
-    # Generate signed JWT with RSA private key
+    # Sign with the loaded private key (EdDSA or RS256, HS256 for the fallback secret)
     try:
-        token = jwt.encode(payload, private_key, algorithm="RS256")
+        token = jwt.encode(payload, private_key, algorithm=algorithm)
     except Exception as e:
-        print(f"  JWT signing failed with RSA key, using HS256: {e}")
+        logger.warning("JWT signing failed with %s key, using HS256: %s", algorithm, e)
         # Fallback to symmetric signing for development
-        token = jwt.encode(payload, "bazel-demo-jwt-signing-key-2024", algorithm="HS256")
+        token = jwt.encode(payload, JWT_FALLBACK_SECRET, algorithm="HS256")
     
     return token
 
-async def authenticate_with_vault_oidc(okta_id_token: str, user_info: Dict[str, Any], selected_team: str = None) -> str:
+async def authenticate_with_vault_oidc(vault: httpx.AsyncClient, okta_id_token: str, user_info: Dict[str, Any], selected_team: str = None) -> str:
     """
     Authenticate with HashiCorp Vault using team-based JWT.
     
@@ -334,6 +862,7 @@ async def authenticate_with_vault_oidc(okta_id_token: str, user_info: Dict[str,
     entities per team rather than individual user entities.
     
     Args:
+        vault: Shared Vault API client
         okta_id_token: JWT ID token from Okta (used for user verification)
         user_info: User profile information including groups from Okta
         selected_team: Specific team selected by user (optional)
@@ -353,47 +882,59 @@ async def authenticate_with_vault_oidc(okta_id_token: str, user_info: Dict[str,
             # Use selected team to determine vault role
             vault_role = team  # The team name is the vault role name
         else:
-            team = determine_team_from_okta_groups(groups)
-            vault_role = determine_vault_role_from_okta_groups(groups)
+            teams = resolve_teams(groups)
+            team = teams.team
+            vault_role = teams.vault_role
         
-        print(f"Authenticating with Vault using team-based JWT")
-        print(f" User: {user_info.get('email', 'unknown')}")
-        print(f"  Team: {team}")
-        print(f" Vault role: {vault_role}")
-        print(f" User groups: {groups}")
+        logger.debug(
+            "Authenticating with Vault using team-based JWT: user=%s team=%s role=%s groups=%s",
+            user_info.get("email", "unknown"), team, vault_role, groups
+        )
         
-        # Generate team-based JWT token
-        team_jwt = generate_team_based_jwt(user_info, team)
-        print(f" Generated team-based JWT for team: {team}")
+        # Generate team-based JWT token. An RSA private-key operation (~0.4ms) runs in
+        # a worker thread so concurrent requests keep being served while it signs;
+        # Ed25519 and HS256 sign in tens of microseconds, less than the thread hop
+        if _SIGNER[1] == "RS256":
+            team_jwt = await asyncio.to_thread(generate_team_based_jwt, user_info, team)
+        else:
+            team_jwt = generate_team_based_jwt(user_info, team)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            vault_auth_url = f"{VAULT_ADDR}/v1/auth/jwt/login"
-            print(f" Vault JWT auth URL: {vault_auth_url}")
-            
-            vault_auth_response = await client.post(
-                vault_auth_url,
-                json={
-                    "jwt": team_jwt,  # Use team-based JWT instead of Okta JWT
-                    "role": vault_role
-                }
-            )
-            
-            print(f" Vault auth response status: {vault_auth_response.status_code}")
-            if vault_auth_response.status_code != 200:
-                print(f" Vault JWT auth failed: {vault_auth_response.text}")
-                raise RuntimeError(f"Vault JWT auth failed: {vault_auth_response.text}")
-            
-            vault_auth = vault_auth_response.json()
-            vault_token = vault_auth["auth"]["client_token"]
-            entity_id = vault_auth["auth"].get("entity_id", "unknown")
-            
-            print(f"✓ User {user_info.get('email', 'unknown')} authenticated with Vault via team-based JWT")
-            print(f"  Entity ID: {entity_id} (shared by team: {team})")
-            return vault_token
+        vault_auth_response = await vault.post(
+            VAULT_JWT_LOGIN_PATH,
+            content=orjson.dumps({
+                "jwt": team_jwt,  # Use team-based JWT instead of Okta JWT
+                "role": vault_role
+            }),
+            headers={"Content-Type": "application/json"}
+        )
+        
+        logger.debug("Vault auth response status: %s", vault_auth_response.status_code)
+        if vault_auth_response.status_code != 200:
+            logger.warning("Vault JWT auth failed: %s", vault_auth_response.text)
+            raise RuntimeError(f"Vault JWT auth failed: {vault_auth_response.text}")
+        
+        vault_auth = orjson.loads(vault_auth_response.content)["auth"]
+        vault_token = vault_auth["client_token"]
+        entity_id = vault_auth.get("entity_id", "unknown")
+        
+        logger.info(
+            "User %s authenticated with Vault via team-based JWT (entity %s shared by team %s)",
+            user_info.get("email", "unknown"), entity_id, team
+        )
+        return vault_token
     except Exception as e:
-        print(f"💥 Exception in authenticate_with_vault_oidc: {e}")
+        logger.warning("Exception in authenticate_with_vault_oidc: %s", e)
         raise
 
+def generate_pkce_pair() -> Tuple[str, str]:
+    """Generate a PKCE (code_verifier, S256 code_challenge) pair"""
+    # Keep the verifier as bytes until it has been hashed so it is never re-encoded
+    verifier_bytes = _b64(_urandom(32)).rstrip(b'=')
+    code_challenge = _b64(
+        hashlib.sha256(verifier_bytes).digest()
+    ).rstrip(b'=').decode('ascii')
+    return verifier_bytes.decode('ascii'), code_challenge
+
 async def pkce_auth_start() -> Dict[str, Any]:
     """
     Start Authorization Code Flow with PKCE for CLI authentication.
@@ -408,41 +949,19 @@ async def pkce_auth_start() -> Dict[str, Any]:
         - instructions: Step-by-step user instructions
         
     Note:
-        PKCE parameters (code_verifier, code_challenge) are stored in app.pkce_sessions
-        for later verification during token exchange.
+        The PKCE code_verifier is stored by store_pkce_session() for later
+        verification during token exchange.
     """
-    import secrets
-    import hashlib
-    import base64
-    
     # Generate PKCE parameters
-    code_verifier = base64.urlsafe_b64encode(secrets.token_bytes(32)).decode('utf-8').rstrip('=')
-    code_challenge = base64.urlsafe_b64encode(
-        hashlib.sha256(code_verifier.encode('utf-8')).digest()
-    ).decode('utf-8').rstrip('=')
-    
-    state = secrets.token_urlsafe(16)
-    
-    # Store PKCE data temporarily (in production, use Redis/DB)
-    pkce_sessions = getattr(app, 'pkce_sessions', {})
-    pkce_sessions[state] = {
-        "code_verifier": code_verifier,
-        "created_at": time.time()
-    }
-    app.pkce_sessions = pkce_sessions
+    code_verifier, code_challenge = generate_pkce_pair()
     
-    # Generate authorization URL
-    params = {
-        "client_id": OKTA_CLIENT_ID,
-        "response_type": "code",
-        "scope": "openid profile email groups",
-        "redirect_uri": OKTA_REDIRECT_URI,  # Use existing configured URI
-        "state": state,
-        "code_challenge": code_challenge,
-        "code_challenge_method": "S256"
-    }
+    state = random_token()
+    
+    # Store PKCE data temporarily
+    await store_pkce_session(state, PkceSession(code_verifier, time.time(), is_cli=True))
     
-    auth_url = f"https://{OKTA_DOMAIN}/oauth2/{OKTA_AUTH_SERVER_ID}/v1/authorize?{urlencode(params)}"
+    # Generate authorization URL (uses the existing configured redirect URI)
+    auth_url = get_pkce_auth_url(state, code_challenge)
     
     return {
         "auth_url": auth_url,
@@ -455,52 +974,85 @@ async def pkce_auth_start() -> Dict[str, Any]:
         }
     }
 
-async def pkce_auth_exchange(code: str, state: str) -> Dict[str, Any]:
-    """Exchange authorization code with PKCE for tokens"""
+async def pkce_auth_exchange(code: str, state: str) -> Tuple[Dict[str, Any], PkceSession]:
+    """
+    Exchange authorization code with PKCE for tokens.
     
-    # Retrieve PKCE data
-    pkce_sessions = getattr(app, 'pkce_sessions', {})
-    if state not in pkce_sessions:
+    Returns the token response together with the consumed PKCE session, so the
+    caller knows which flow (browser or CLI) the state was started for.
+    Concurrent calls for the same state (callback retries, double clicks) share a
+    single token request, since Okta rejects a second redemption of the code.
+    """
+    task = _pkce_exchange_inflight.get(state)
+    if task is None:
+        # Registered before the session lookup awaits, so a concurrent caller joins
+        # this exchange instead of finding the state already consumed
+        task = asyncio.ensure_future(_redeem_pkce_state(code, state))
+        _pkce_exchange_inflight[state] = task
+        task.add_done_callback(lambda _: _pkce_exchange_inflight.pop(state, None))
+    
+    return await asyncio.shield(task)
+
+async def _redeem_pkce_state(code: str, state: str) -> Tuple[Dict[str, Any], PkceSession]:
+    """Consume the PKCE session for a state and redeem the code with its verifier"""
+    pkce_data = await take_pkce_session(state)
+    if pkce_data is None:
         raise HTTPException(status_code=400, detail="Invalid or expired PKCE state")
     
-    pkce_data = pkce_sessions[state]
-    code_verifier = pkce_data["code_verifier"]
-    
-    # Clean up old session
-    del pkce_sessions[state]
-    
+    return await _pkce_token_request(code, pkce_data.code_verifier), pkce_data
+
+async def _pkce_token_request(code: str, code_verifier: str) -> Dict[str, Any]:
+    """Redeem an authorization code plus PKCE verifier at the Okta token endpoint"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            token_url = f"https://{OKTA_DOMAIN}/oauth2/{OKTA_AUTH_SERVER_ID}/v1/token"
-            print(f" PKCE token exchange at: {token_url}")
-            
-            token_response = await client.post(
-                token_url,
-                data={
-                    "grant_type": "authorization_code",
-                    "client_id": OKTA_CLIENT_ID,
-                    "client_secret": OKTA_CLIENT_SECRET,  # Add client secret for Web Application
-                    "code": code,
-                    "redirect_uri": OKTA_REDIRECT_URI,
-                    "code_verifier": code_verifier
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"}
+        client = app.state.http
+        logger.debug("PKCE token exchange at: %s", OKTA_TOKEN_URL)
+        
+        token_response = await client.post(
+            OKTA_TOKEN_URL,
+            data={
+                "grant_type": "authorization_code",
+                "client_id": OKTA_CLIENT_ID,
+                "client_secret": OKTA_CLIENT_SECRET,  # Add client secret for Web Application
+                "code": code,
+                "redirect_uri": OKTA_REDIRECT_URI,
+                "code_verifier": code_verifier
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        
+        logger.debug("PKCE token response status: %s", token_response.status_code)
+        if token_response.status_code != 200:
+            logger.warning("PKCE token exchange failed: %s", token_response.text)
+            raise HTTPException(
+                status_code=400,
+                detail=f"PKCE token exchange failed: {token_response.text}"
             )
-            
-            print(f" PKCE token response status: {token_response.status_code}")
-            if token_response.status_code != 200:
-                print(f" PKCE token exchange failed: {token_response.text}")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"PKCE token exchange failed: {token_response.text}"
-                )
-            
-            return token_response.json()
+        
+        return orjson.loads(token_response.content)
     except Exception as e:
-        print(f" Exception in pkce_auth_exchange: {e}")
+        logger.warning("Exception in pkce_auth_exchange: %s", e)
         raise
 
-async def create_child_token(parent_token: str, user_info: Dict[str, Any], request_body: Dict[str, Any], selected_team: str = None) -> Dict[str, Any]:
+async def _vault_create_child(vault: httpx.AsyncClient, parent_token: str, create_path: str, token_request: Dict[str, Any]) -> Dict[str, Any]:
+    """Create a child token under a token role with the parent token; returns Vault's auth block"""
+    child_token_response = await vault.post(
+        create_path,
+        headers={
+            "X-Vault-Token": parent_token,  # Use parent token instead of root token
+            "Content-Type": "application/json"
+        },
+        content=orjson.dumps(token_request)
+    )
+    
+    if child_token_response.status_code != 200:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to create child token: {child_token_response.text}"
+        )
+    
+    return orjson.loads(child_token_response.content)["auth"]
+
+async def create_child_token(vault: httpx.AsyncClient, parent_token: str, user_info: Dict[str, Any], request_body: ExchangeRequest, selected_team: str = None, session_id: str = None, now: Optional[float] = None) -> Dict[str, Any]:
     """
     Create a constrained child Vault token with user metadata and team-specific policies.
     
@@ -512,16 +1064,22 @@ async def create_child_token(parent_token: str, user_info: Dict[str, Any], reque
     - Cannot escalate privileges beyond parent token constraints
     
     Args:
+        vault: Shared Vault API client
         parent_token: Parent Vault token (from JWT role authentication)
         user_info: User profile from Okta (email, name, groups)
         request_body: Request metadata (pipeline, repo, target)
         selected_team: Team context selected by user
+        session_id: Broker session the request belongs to; enables reuse of a
+            child token minted for the same (pipeline, repo, target) moments ago
+            (returned with shared=True and without uses_remaining)
+        now: Request timestamp taken by the caller (defaults to time.time())
         
     Returns:
         Dict containing:
         - token: Child Vault token
         - ttl: Time to live in seconds
-        - uses_remaining: Number of uses allowed
+        - uses_remaining: Number of uses allowed (freshly minted tokens only)
+        - shared: True when a recently minted token is handed out again
         - policies: Applied Vault policies (constrained by token role)
         - metadata: User and request metadata
         
@@ -529,18 +1087,18 @@ async def create_child_token(parent_token: str, user_info: Dict[str, Any], reque
         HTTPException: If child token creation fails or parent token is invalid
     """
     
-    # Validate the parent token has proper role-based constraints
-    await validate_parent_token(parent_token)
-    
     # Extract user information
-    email = user_info.get("email", "unknown@example.com")
-    name = user_info.get("name", "Unknown User")
-    groups = user_info.get("groups", [])
+    user_get = user_info.get
+    email = user_get("email", "unknown@example.com")
+    name = user_get("name", "Unknown User")
+    groups = user_get("groups") or []
+    # Vault metadata values must be strings; a lone group string is kept whole
+    groups_str = ",".join(groups) if type(groups) is list else str(groups)
     
     # Extract additional metadata from request (for Bazel context)
-    pipeline = request_body.get("pipeline", "unknown")
-    repo = request_body.get("repo", "unknown") 
-    target = request_body.get("target", "unknown")
+    pipeline = request_body.pipeline
+    repo = request_body.repo
+    target = request_body.target
     
     # Use selected team if provided, otherwise determine from groups (fallback)
     if selected_team and selected_team != "unknown":
@@ -549,90 +1107,185 @@ async def create_child_token(parent_token: str, user_info: Dict[str, Any], reque
         # Fallback: determine team from groups (for backward compatibility)
         team = "unknown"
         for group in groups:
-            if "developers" in group.lower():
+            lowered = group.lower()
+            if "developers" in lowered:
                 team = group.replace("-developers", "-team")
                 break
-            elif "devops" in group.lower():
+            elif "devops" in lowered:
                 team = "devops-team"
                 break
     
-    # Team-specific token role mapping for secure child token creation
-    team_token_role_mapping = {
-        "mobile-team": "mobile-team-token",
-        "backend-team": "backend-team-token", 
-        "frontend-team": "frontend-team-token",
-        "devops-team": "devops-team-token",
-        "base-team": "base-team-token"
-    }
-    
-    token_role = team_token_role_mapping.get(team, "base-team-token")
-    
-    async with httpx.AsyncClient() as client:
-        # Use token role for secure child token creation
-        child_token_response = await client.post(
-            f"{VAULT_ADDR}/v1/auth/token/create/{token_role}",
-            headers={"X-Vault-Token": parent_token},  # Use parent token instead of root token
-            json={
-                "ttl": "2h",
-                "num_uses": 10,
-                "renewable": False,
-                "metadata": {
-                    "team": team,
-                    "user": email,
-                    "name": name,
-                    "pipeline": pipeline,
-                    "repo": repo,
-                    "target": target,
-                    "source": "oidc-broker",
-                    "groups": ",".join(groups)
-                },
-                # Remove explicit policies - inherit from parent token
-                "display_name": f"bazel-{team}-{email.split('@')[0]}",
-            }
-        )
-        
-        if child_token_response.status_code != 200:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to create child token: {child_token_response.text}"
-            )
-        
-        child_token_data = child_token_response.json()
-        
-        return {
-            "token": child_token_data["auth"]["client_token"],
-            "ttl": child_token_data["auth"]["lease_duration"],
-            "uses_remaining": 10,
-            "policies": child_token_data["auth"]["policies"],
+    # Reuse a token minted for this exact request moments ago. No Vault round trip:
+    # revoking the parent revokes its children, so a cached child dies with it.
+    if now is None:
+        now = time.time()
+    cache_key = (session_id, pipeline, repo, target, team)
+    if session_id is not None:
+        cached = _child_token_cache.get(cache_key)
+        if cached is not None and now < cached["expires_at"]:
+            return {k: v for k, v in cached.items() if k != "expires_at"}
+    
+    # Validate the parent token has proper role-based constraints. This gates the
+    # create call and must finish first: running both concurrently would mint a
+    # child token before a rejected parent could stop it.
+    await validate_parent_token(vault, parent_token, now)
+    
+    # Use the team-specific token role for secure child token creation
+    child_auth = await _vault_create_child(
+        vault,
+        parent_token,
+        _TOKEN_CREATE_PATHS.get(team, _DEFAULT_TOKEN_CREATE_PATH),
+        {
+            **_CHILD_TOKEN_REQUEST_BASE,
             "metadata": {
                 "team": team,
                 "user": email,
                 "name": name,
                 "pipeline": pipeline,
-                "groups": groups
-            }
+                "repo": repo,
+                "target": target,
+                "source": "oidc-broker",
+                "groups": groups_str
+            },
+            "display_name": f"bazel-{team}-{email.partition('@')[0]}",
         }
+    )
+    
+    result = {
+        "token": child_auth["client_token"],
+        "ttl": child_auth["lease_duration"],
+        "uses_remaining": CHILD_TOKEN_NUM_USES,
+        "policies": child_auth["policies"],
+        "metadata": {
+            "team": team,
+            "user": email,
+            "name": name,
+            "pipeline": pipeline,
+            "groups": groups
+        }
+    }
+    
+    if session_id is not None:
+        _child_token_cache[cache_key] = {
+            **{k: v for k, v in result.items() if k != "uses_remaining"},
+            "shared": True,
+            "expires_at": now + result["ttl"],
+        }
+    
+    return result
+
+async def _reap_expired_sessions():
+    """
+    Evict expired user, team-selection and PKCE sessions.
+    
+    A single task sleeps until the earliest deadline in _expiry_heap (or until
+    an earlier one is scheduled), then pops everything that is due. No request
+    ever scans the session stores.
+    
+    TTLCache only drops stale entries when it is written to, so the task also
+    wakes at least every CACHE_SWEEP_INTERVAL seconds to purge the userinfo,
+    child-token and parent-token caches; otherwise tokens could sit in memory
+    long after their TTL on an idle broker.
+    """
+    while True:
+        now = time.time()
+        while _expiry_heap and _expiry_heap[0][0] <= now:
+            _, kind, key = heapq.heappop(_expiry_heap)
+            _EXPIRY_STORES[kind].pop(key, None)
+        
+        _userinfo_cache.expire()
+        _child_token_cache.expire()
+        _parent_token_cache.expire()
+        
+        delay = min(_expiry_heap[0][0] - now, CACHE_SWEEP_INTERVAL) if _expiry_heap else CACHE_SWEEP_INTERVAL
+        _expiry_wakeup.clear()
+        try:
+            await asyncio.wait_for(_expiry_wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+def _schedule_key_reload() -> None:
+    """SIGHUP handler: start a signing key reload, holding a reference until it finishes"""
+    task = asyncio.ensure_future(_reload_signing_key())
+    app.state.key_reloads.add(task)
+    task.add_done_callback(app.state.key_reloads.discard)
 
-# Startup validation
-@app.on_event("startup")
-async def startup():
-    """Validate configuration on startup"""
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Broker lifetime: validate configuration, open the shared HTTP clients and warm
+    up backends before serving, then stop background tasks and close the shared
+    HTTP, Vault and Redis clients on shutdown.
+    """
     try:
         validate_okta_config()
-        print(f"✓ Okta OIDC configured for domain: {OKTA_DOMAIN}")
-        print(" Bazel JWT Vault Demo ready with Okta OIDC authentication")
-        print("  Vault connectivity will be verified on first request")
+        
+        current_default_thread_limiter().total_tokens = BROKER_THREADS
+        
+        # One pooled client for all Okta calls so TCP/TLS connections
+        # (and HTTP/2 streams where the server supports it) are reused
+        app.state.http = httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        )
+        # Dedicated keep-alive pool for Vault; requests use paths relative to VAULT_ADDR.
+        # HTTP/2 is negotiated via ALPN when VAULT_ADDR is https (plain http stays on 1.1)
+        app.state.vault = httpx.AsyncClient(
+            base_url=VAULT_ADDR,
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+        app.state.redis = aioredis.from_url(REDIS_URL) if REDIS_URL else None
+        app.state.session_reaper = asyncio.create_task(_reap_expired_sessions())
+        await _warm_up()
+        
+        # `kill -HUP` picks up a rotated signing key without a restart (Unix, main thread only)
+        loop = asyncio.get_running_loop()
+        app.state.key_reloads = set()
+        try:
+            loop.add_signal_handler(signal.SIGHUP, _schedule_key_reload)
+            sighup_installed = True
+        except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+            sighup_installed = False
+        logger.info("Okta OIDC configured for domain: %s", OKTA_DOMAIN)
+        logger.info("Session store: %s", "redis" if REDIS_URL else "in-memory")
+        logger.info("Bazel JWT Vault Demo ready with Okta OIDC authentication")
         
     except Exception as e:
-        print(f" Failed to initialize broker: {e}")
+        logger.error("Failed to initialize broker: %s", e)
         raise
+    
+    try:
+        yield
+    finally:
+        if sighup_installed:
+            loop.remove_signal_handler(signal.SIGHUP)
+        app.state.session_reaper.cancel()
+        await app.state.http.aclose()
+        await app.state.vault.aclose()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
+
+async def get_vault_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the shared Vault client opened at startup (async, so it skips the threadpool)"""
+    return request.app.state.vault
+
+app = FastAPI(
+    title="Bazel JWT Vault Demo - Okta OIDC",
+    version="2.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
+)
+# HTML pages and static assets compress well; small JSON bodies are left alone
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+app.mount("/static", ImmutableStaticFiles(directory=_STATIC_DIR), name="static")
 
 # Routes
 
-@app.get("/")
-async def home():
-    """Home page with login link"""
-    return HTMLResponse(f"""
+# The landing page only depends on startup configuration, so it is rendered once
+_HOME_HTML = f"""
     <!DOCTYPE html>
     <html>
     <head>
@@ -682,47 +1335,31 @@ async def home():
         </div>
     </body>
     </html>
-    """)
+    """.encode("utf-8")
+
+@app.get("/")
+async def home():
+    """Home page with login link"""
+    return Response(content=_HOME_HTML, media_type="text/html")
 
 @app.get("/auth/login")
 async def login():
     """Initiate Okta OIDC login flow with PKCE"""
-    import secrets
-    import hashlib
-    import base64
-    
     # Generate PKCE parameters for browser flow too
-    code_verifier = base64.urlsafe_b64encode(secrets.token_bytes(32)).decode('utf-8').rstrip('=')
-    code_challenge = base64.urlsafe_b64encode(
-        hashlib.sha256(code_verifier.encode('utf-8')).digest()
-    ).decode('utf-8').rstrip('=')
+    code_verifier, code_challenge = generate_pkce_pair()
     
-    state = secrets.token_urlsafe(16)
+    state = random_token()
     
     # Store PKCE data for browser flow
-    pkce_sessions = getattr(app, 'pkce_sessions', {})
-    pkce_sessions[state] = {
-        "code_verifier": code_verifier,
-        "created_at": time.time()
-    }
-    app.pkce_sessions = pkce_sessions
+    await store_pkce_session(state, PkceSession(code_verifier, time.time(), is_cli=False))
     
     # Generate authorization URL with PKCE
-    params = {
-        "client_id": OKTA_CLIENT_ID,
-        "response_type": "code",
-        "scope": "openid profile email groups",
-        "redirect_uri": OKTA_REDIRECT_URI,
-        "state": state,
-        "code_challenge": code_challenge,
-        "code_challenge_method": "S256"
-    }
-    
-    auth_url = f"https://{OKTA_DOMAIN}/oauth2/{OKTA_AUTH_SERVER_ID}/v1/authorize?{urlencode(params)}"
+    auth_url = get_pkce_auth_url(state, code_challenge)
     return RedirectResponse(url=auth_url)
 
 @app.get("/auth/callback")
-async def auth_callback(code: str = None, state: str = None, error: str = None):
+async def auth_callback(code: str = None, state: str = None, error: str = None,
+                        vault: httpx.AsyncClient = Depends(get_vault_client)):
     """Handle Okta OIDC callback (unified PKCE flow for both browser and CLI)"""
     if error:
         raise HTTPException(status_code=400, detail=f"Okta auth error: {error}")
@@ -731,90 +1368,75 @@ async def auth_callback(code: str = None, state: str = None, error: str = None):
         raise HTTPException(status_code=400, detail="No authorization code received")
     
     try:
-        # All flows now use PKCE, so check if state exists in pkce_sessions
-        pkce_sessions = getattr(app, 'pkce_sessions', {})
-        if state not in pkce_sessions:
-            raise HTTPException(status_code=400, detail="Invalid or expired PKCE state")
-        
-        # Use PKCE exchange for all flows
-        token_data = await pkce_auth_exchange(code, state)
+        # Use PKCE exchange for all flows (rejects unknown or expired states); the
+        # flow type was recorded when the PKCE session was created
+        token_data, pkce_data = await pkce_auth_exchange(code, state)
+        is_cli_request = pkce_data.is_cli
         id_token = token_data["id_token"]
         access_token = token_data["access_token"]
         
-        # Get user information
-        user_info = await get_user_info(access_token)
+        user_info = None
+        vault_token = None
         
-        # Determine if this was a CLI request based on state prefix or session storage
-        is_cli_request = state.startswith("cli_") if state else False
+        # Okta embeds groups in the ID token when the groups scope is granted, so the
+        # team can usually be resolved locally and the Vault login overlapped with the
+        # userinfo call. The signature is checked against the prefetched Okta keys.
+        id_claims = await _read_id_token_claims(id_token)
+        claim_groups = id_claims.get("groups")
+        if isinstance(claim_groups, list):
+            available_teams = resolve_teams(claim_groups).available_teams
+            if len(available_teams) == 1:
+                vault_token, user_info = await asyncio.gather(
+                    authenticate_with_vault_oidc(vault, id_token, id_claims, available_teams[0]),
+                    get_user_info(access_token)
+                )
         
-        # Get user's groups and determine available teams
-        groups = user_info.get("groups", [])
-        available_teams = determine_available_teams_from_groups(groups)
+        if user_info is None:
+            # Get user information
+            user_info = await get_user_info(access_token)
+            
+            # Get user's groups and determine available teams
+            groups = user_info.get("groups", [])
+            available_teams = resolve_teams(groups).available_teams
         
         if len(available_teams) == 1:
             # Single team - proceed directly
             selected_team = available_teams[0]
-            vault_token = await authenticate_with_vault_oidc(id_token, user_info, selected_team)
+            if vault_token is None:
+                vault_token = await authenticate_with_vault_oidc(vault, id_token, user_info, selected_team)
+            now = time.time()
             
             # Store session
             session_prefix = "cli_session" if is_cli_request else "session"
-            session_id = f"{session_prefix}_{secrets.token_urlsafe(16)}"
-            _user_sessions[session_id] = {
-                "vault_token": vault_token,
-                "user_info": user_info,
-                "selected_team": selected_team,
-                "okta_tokens": {
-                    "id_token": id_token,
-                    "access_token": access_token
-                },
-                "expires_at": time.time() + 3600,  # 1 hour
-                "auth_method": "cli_pkce" if is_cli_request else "browser_pkce"
-            }
-            
-            response_data = {
-                "message": "Successfully authenticated with Okta and Vault",
-                "session_id": session_id,
-            "user": {
-                "email": user_info.get("email"),
-                "name": user_info.get("name"),
-                "groups": user_info.get("groups", [])
-            },
-            "vault_token_preview": vault_token[:10] + "..." if vault_token else None,
-            "auth_method": "CLI/PKCE" if is_cli_request else "Browser/PKCE",
-            "next_steps": {
-                "description": "Use the session_id to exchange for child tokens",
-                "example": {
-                    "url": "/exchange",
-                    "method": "POST",
-                    "body": {
-                        "session_id": session_id,
-                        "pipeline": "your-pipeline",
-                        "repo": "your-repo",
-                        "target": "your-target"
-                    }
-                }
-            }
-        }
+            session_id = f"{session_prefix}_{random_token()}"
+            await store_session(session_id, UserSession(
+                vault_token=vault_token,
+                user_info=user_info,
+                selected_team=selected_team,
+                id_token=id_token,
+                access_token=access_token,
+                expires_at=now + 3600,  # 1 hour
+                auth_method="cli_pkce" if is_cli_request else "browser_pkce"
+            ), now)
         else:
             # Multiple teams - redirect to team selection page
             # Store temporary session data for team selection
-            temp_session_id = f"temp_{secrets.token_urlsafe(16)}"
-            _user_sessions[temp_session_id] = {
-                "user_info": user_info,
-                "available_teams": available_teams,
-                "okta_tokens": {
-                    "id_token": id_token,
-                    "access_token": access_token
-                },
-                "expires_at": time.time() + 600,  # 10 minutes for team selection
-                "auth_method": "cli_pkce" if is_cli_request else "browser_pkce",
-                "is_cli_request": is_cli_request,
-                "state": state
-            }
+            temp_session_id = f"temp_{random_token()}"
+            now = time.time()
+            await store_session(temp_session_id, TeamSelectionSession(
+                user_info=user_info,
+                available_teams=available_teams,
+                id_token=id_token,
+                access_token=access_token,
+                expires_at=now + 600,  # 10 minutes for team selection
+                auth_method="cli_pkce" if is_cli_request else "browser_pkce",
+                is_cli_request=is_cli_request,
+                state=state
+            ), now)
             
             if is_cli_request:
                 # For CLI, return team selection prompt
-                return JSONResponse({
+                return ORJSONResponse({
                     "message": "Multiple teams available - please select one",
                     "available_teams": available_teams,
                     "temp_session_id": temp_session_id,
@@ -833,443 +1455,187 @@ async def auth_callback(code: str = None, state: str = None, error: str = None):
                 return RedirectResponse(url=f"/auth/select-team?temp_session_id={temp_session_id}")
         
         if is_cli_request:
-            # For CLI, return JSON directly
-            return JSONResponse(response_data)
+            # For CLI, return JSON directly (only built here; the browser page needs none of it)
+            return ORJSONResponse({
+                "message": "Successfully authenticated with Okta and Vault",
+                "session_id": session_id,
+                "user": {
+                    "email": user_info.get("email"),
+                    "name": user_info.get("name"),
+                    "groups": user_info.get("groups", [])
+                },
+                "vault_token_preview": vault_token[:10] + "..." if vault_token else None,
+                "auth_method": "CLI/PKCE",
+                "next_steps": {
+                    "description": "Use the session_id to exchange for child tokens",
+                    "example": {
+                        "url": "/exchange",
+                        "method": "POST",
+                        "body": {
+                            "session_id": session_id,
+                            "pipeline": "your-pipeline",
+                            "repo": "your-repo",
+                            "target": "your-target"
+                        }
+                    }
+                }
+            })
         else:
             # For browser, return HTML page with enhanced UX
-            return HTMLResponse(f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>Authentication Successful</title>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 40px; background: #f8f9fa; }}
-                    .container {{ max-width: 700px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                    .success {{ background: #d4edda; padding: 20px; border-radius: 8px; margin: 20px 0; border: 1px solid #c3e6cb; }}
-                    .info {{ background: #e7f3ff; padding: 20px; border-radius: 8px; margin: 20px 0; border: 1px solid #b3d7ff; }}
-                    .session-box {{ background: #fff3cd; padding: 15px; border-radius: 8px; margin: 15px 0; border: 1px solid #ffeaa7; position: relative; }}
-                    .copy-btn {{ background: #007cba; color: white; border: none; padding: 8px 16px; border-radius: 4px; cursor: pointer; margin-left: 10px; }}
-                    .copy-btn:hover {{ background: #005a8b; }}
-                    .copied {{ background: #28a745 !important; }}
-                    pre {{ background: #f8f9fa; padding: 15px; border-radius: 4px; overflow-x: auto; border: 1px solid #dee2e6; }}
-                    .command-box {{ background: #2d3748; color: #e2e8f0; padding: 15px; border-radius: 8px; margin: 10px 0; font-family: 'Courier New', monospace; }}
-                    .highlight {{ background: #ffeaa7; padding: 2px 4px; border-radius: 3px; font-weight: bold; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h1> Authentication Successful!</h1>
-                    <div class="success">
-                        <p><strong>Welcome:</strong> {user_info.get('email', 'Unknown')}</p>
-                        <p><strong>Teams:</strong> {', '.join(user_info.get('groups', []))}</p>
-                    </div>
-                    
-                    <div class="session-box">
-                        <p><strong> Your Session ID:</strong></p>
-                        <p style="font-family: monospace; word-break: break-all; margin: 10px 0;">
-                            <span id="sessionId">{session_id}</span>
-                            <button class="copy-btn" onclick="copySessionId()"> Copy</button>
-                        </p>
-                    </div>
-                    
-                    <div class="info">
-                        <h3> Quick Commands</h3>
-                        <p><strong>Get your Vault token:</strong></p>
-                        <div class="command-box">
-curl -X POST http://localhost:8081/exchange \\<br>
-&nbsp;&nbsp;-H "Content-Type: application/json" \\<br>
-&nbsp;&nbsp;-d '{{"session_id": "{session_id}", "pipeline": "my-pipeline", "repo": "my-repo", "target": "my-target"}}'
-                        </div>
-                        <button class="copy-btn" onclick="copyCurlCommand()"> Copy curl command</button>
-                        
-                        <p style="margin-top: 20px;"><strong>Or use our CLI tool:</strong></p>
-                        <div class="command-box">
-./tools/bazel-auth-simple --session-id {session_id}
-                        </div>
-                        <button class="copy-btn" onclick="copyCliCommand()"> Copy CLI command</button>
-                    </div>
-                    
-                    <div class="info">
-                        <h3> Token Exchange Payload</h3>
-                        <p>You can customize the metadata for your specific use case:</p>
-                        <pre id="exchangePayload">{json.dumps(response_data['next_steps']['example']['body'], indent=2)}</pre>
-                        <button class="copy-btn" onclick="copyPayload()"> Copy JSON</button>
-                    </div>
-                    
-                    <p style="text-align: center; margin-top: 30px;">
-                        <a href="/" style="color: #007cba; text-decoration: none;">← Back to Home</a>
-                    </p>
-                </div>
-                
-                <script>
-                function copyToClipboard(text, button) {{
-                    navigator.clipboard.writeText(text).then(function() {{
-                        const originalText = button.textContent;
-                        button.textContent = ' Copied!';
-                        button.classList.add('copied');
-                        setTimeout(() => {{
-                            button.textContent = originalText;
-                            button.classList.remove('copied');
-                        }}, 2000);
-                    }}).catch(function() {{
-                        // Fallback for older browsers
-                        const textArea = document.createElement('textarea');
-                        textArea.value = text;
-                        document.body.appendChild(textArea);
-                        textArea.select();
-                        document.execCommand('copy');
-                        document.body.removeChild(textArea);
-                        
-                        const originalText = button.textContent;
-                        button.textContent = ' Copied!';
-                        button.classList.add('copied');
-                        setTimeout(() => {{
-                            button.textContent = originalText;
-                            button.classList.remove('copied');
-                        }}, 2000);
-                    }});
-                }}
-                
-                function copySessionId() {{
-                    const sessionId = document.getElementById('sessionId').textContent;
-                    const button = event.target;
-                    copyToClipboard(sessionId, button);
-                }}
-                
-                function copyPayload() {{
-                    const payload = document.getElementById('exchangePayload').textContent;
-                    const button = event.target;
-                    copyToClipboard(payload, button);
-                }}
-                
-                function copyCurlCommand() {{
-                    const command = `curl -X POST http://localhost:8081/exchange \\\\
-  -H "Content-Type: application/json" \\\\
-  -d '{{"session_id": "{session_id}", "pipeline": "my-pipeline", "repo": "my-repo", "target": "my-target"}}'`;
-                    const button = event.target;
-                    copyToClipboard(command, button);
-                }}
-                
-                function copyCliCommand() {{
-                    const command = './tools/bazel-auth-simple --session-id {session_id}';
-                    const button = event.target;
-                    copyToClipboard(command, button);
-                }}
-                
-                // Auto-copy session ID to clipboard on page load
-                window.addEventListener('load', function() {{
-                    const sessionId = document.getElementById('sessionId').textContent;
-                    navigator.clipboard.writeText(sessionId).catch(() => {{
-                        // Silently fail if clipboard API not available
-                    }});
-                }});
-                </script>
-            </body>
-            </html>
-            """)
+            return _render_auth_success(
+                session_id,
+                user_info,
+                Markup("<p><strong>Teams:</strong> {}</p>").format(", ".join(user_info.get("groups", [])))
+            )
         
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
+    except HTTPException:
+        # Already carries the right status (e.g. 400 for an unknown PKCE state)
+        raise
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=f"Invalid Okta ID token: {e}")
+    except (httpx.HTTPError, RuntimeError, KeyError) as e:
+        # Okta or Vault unreachable, or a token response missing its tokens;
+        # anything else propagates to FastAPI's 500 handler and is logged there
+        raise HTTPException(status_code=500, detail=f"Authentication failed: {e}")
 
 @app.get("/auth/select-team")
 async def team_selection_page(temp_session_id: str):
     """Display team selection page for users with multiple team memberships"""
-    if temp_session_id not in _user_sessions:
+    session_data = await load_session(temp_session_id, TeamSelectionSession)
+    if session_data is None:
         raise HTTPException(status_code=400, detail="Invalid or expired session")
     
-    session_data = _user_sessions[temp_session_id]
-    user_info = session_data["user_info"]
-    available_teams = session_data["available_teams"]
-    
-    # Generate team selection HTML
-    team_options = ""
-    for team in available_teams:
-        team_display = team.replace("-", " ").title()
-        team_options += f'''
-            <div class="team-option">
-                <input type="radio" id="{team}" name="selected_team" value="{team}" />
-                <label for="{team}">{team_display}</label>
-            </div>
-        '''
+    user_info = session_data.user_info
+    available_teams = session_data.available_teams
     
-    return HTMLResponse(f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Select Team Context</title>
-        <style>
-            body {{ font-family: Arial, sans-serif; margin: 40px; background: #f8f9fa; }}
-            .container {{ max-width: 600px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-            .user-info {{ background: #e7f3ff; padding: 20px; border-radius: 8px; margin: 20px 0; border: 1px solid #b3d7ff; }}
-            .team-option {{ margin: 15px 0; padding: 15px; border: 2px solid #dee2e6; border-radius: 8px; cursor: pointer; transition: all 0.2s; }}
-            .team-option:hover {{ border-color: #007cba; background: #f8f9fa; }}
-            .team-option input[type="radio"] {{ margin-right: 10px; }}
-            .submit-btn {{ background: #007cba; color: white; border: none; padding: 12px 24px; border-radius: 4px; cursor: pointer; font-size: 16px; }}
-            .submit-btn:hover {{ background: #005a8b; }}
-            .submit-btn:disabled {{ background: #6c757d; cursor: not-allowed; }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1> Select Team Context</h1>
-            <div class="user-info">
-                <p><strong>Welcome:</strong> {user_info.get('email', 'Unknown')}</p>
-                <p>You belong to multiple teams. Please select which team context you'd like to use for this session.</p>
-            </div>
-            
-            <form id="teamForm" method="post" action="/auth/select-team">
-                <input type="hidden" name="temp_session_id" value="{temp_session_id}" />
-                {team_options}
-                <br/>
-                <button type="submit" class="submit-btn" id="submitBtn" disabled>Continue with Selected Team</button>
-            </form>
-        </div>
-        
-        <script>
-            const form = document.getElementById('teamForm');
-            const submitBtn = document.getElementById('submitBtn');
-            const radioButtons = document.querySelectorAll('input[name="selected_team"]');
-            
-            radioButtons.forEach(radio => {{
-                radio.addEventListener('change', () => {{
-                    submitBtn.disabled = false;
-                }});
-            }});
-        </script>
-    </body>
-    </html>
-    """)
+    return render_page(
+        SELECT_TEAM_TMPL,
+        user_info=user_info,
+        team_options=_render_team_options(available_teams),
+        temp_session_id=temp_session_id
+    )
 
 @app.post("/auth/select-team")
-async def complete_team_selection(req: Request):
+async def complete_team_selection(form: Annotated[TeamSelectionForm, Form()], vault: httpx.AsyncClient = Depends(get_vault_client)):
     """Complete authentication with selected team"""
-    form_data = await req.form()
-    temp_session_id = form_data.get("temp_session_id")
-    selected_team = form_data.get("selected_team")
+    temp_session_id = form.temp_session_id
+    selected_team = form.selected_team
     
-    if temp_session_id not in _user_sessions:
+    now = time.time()
+    session_data = await load_session(temp_session_id, TeamSelectionSession, now)
+    if session_data is None:
         raise HTTPException(status_code=400, detail="Invalid or expired session")
     
     if not selected_team:
         raise HTTPException(status_code=400, detail="No team selected")
     
-    session_data = _user_sessions[temp_session_id]
-    user_info = session_data["user_info"]
-    available_teams = session_data["available_teams"]
+    user_info = session_data.user_info
+    available_teams = session_data.available_teams
     
     if selected_team not in available_teams:
         raise HTTPException(status_code=400, detail="Invalid team selection")
     
     # Complete Vault authentication with selected team
-    id_token = session_data["okta_tokens"]["id_token"]
-    vault_token = await authenticate_with_vault_oidc(id_token, user_info, selected_team)
+    id_token = session_data.id_token
+    vault_token = await authenticate_with_vault_oidc(vault, id_token, user_info, selected_team)
     
     # Create final session
-    is_cli_request = session_data.get("is_cli_request", False)
+    is_cli_request = session_data.is_cli_request
     session_prefix = "cli_session" if is_cli_request else "session"
-    session_id = f"{session_prefix}_{secrets.token_urlsafe(16)}"
-    
-    _user_sessions[session_id] = {
-        "vault_token": vault_token,
-        "user_info": user_info,
-        "selected_team": selected_team,
-        "okta_tokens": session_data["okta_tokens"],
-        "expires_at": time.time() + 3600,  # 1 hour
-        "auth_method": session_data["auth_method"]
-    }
+    session_id = f"{session_prefix}_{random_token()}"
+    
+    # Store the final session and clean up the temporary one; the two are independent,
+    # so with Redis their round-trips overlap
+    await asyncio.gather(
+        store_session(session_id, UserSession(
+            vault_token=vault_token,
+            user_info=user_info,
+            selected_team=selected_team,
+            id_token=id_token,
+            access_token=session_data.access_token,
+            expires_at=now + 3600,  # 1 hour
+            auth_method=session_data.auth_method
+        ), now),
+        drop_session(temp_session_id, TeamSelectionSession),
+    )
     
-    # Clean up temporary session
-    del _user_sessions[temp_session_id]
-    
-    response_data = {
-        "message": f"Successfully authenticated with {selected_team} team context",
-        "session_id": session_id,
-        "user": {
-            "email": user_info.get("email"),
-            "name": user_info.get("name"),
-            "selected_team": selected_team,
-            "available_teams": available_teams
-        },
-        "vault_token_preview": vault_token[:10] + "..." if vault_token else None,
-        "next_steps": {
-            "description": "Use the session_id to exchange for child tokens",
-            "example": {
-                "url": "/exchange",
-                "method": "POST",
-                "body": {
-                    "session_id": session_id,
-                    "pipeline": "your-pipeline",
-                    "repo": "your-repo", 
-                    "target": "your-target"
+    if is_cli_request:
+        # The JSON summary is only built for CLI callers
+        return ORJSONResponse({
+            "message": f"Successfully authenticated with {selected_team} team context",
+            "session_id": session_id,
+            "user": {
+                "email": user_info.get("email"),
+                "name": user_info.get("name"),
+                "selected_team": selected_team,
+                "available_teams": available_teams
+            },
+            "vault_token_preview": vault_token[:10] + "..." if vault_token else None,
+            "next_steps": {
+                "description": "Use the session_id to exchange for child tokens",
+                "example": {
+                    "url": "/exchange",
+                    "method": "POST",
+                    "body": {
+                        "session_id": session_id,
+                        "pipeline": "your-pipeline",
+                        "repo": "your-repo",
+                        "target": "your-target"
+                    }
                 }
             }
-        }
-    }
-    
-    if is_cli_request:
-        return JSONResponse(response_data)
+        })
     else:
         # For browser, show success page with full automation features
-        return HTMLResponse(f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Authentication Successful</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 40px; background: #f8f9fa; }}
-                .container {{ max-width: 700px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                .success {{ background: #d4edda; padding: 20px; border-radius: 8px; margin: 20px 0; border: 1px solid #c3e6cb; }}
-                .info {{ background: #e7f3ff; padding: 20px; border-radius: 8px; margin: 20px 0; border: 1px solid #b3d7ff; }}
-                .session-box {{ background: #fff3cd; padding: 15px; border-radius: 8px; margin: 15px 0; border: 1px solid #ffeaa7; position: relative; }}
-                .copy-btn {{ background: #007cba; color: white; border: none; padding: 8px 16px; border-radius: 4px; cursor: pointer; margin-left: 10px; }}
-                .copy-btn:hover {{ background: #005a8b; }}
-                .copied {{ background: #28a745 !important; }}
-                pre {{ background: #f8f9fa; padding: 15px; border-radius: 4px; overflow-x: auto; border: 1px solid #dee2e6; }}
-                .command-box {{ background: #2d3748; color: #e2e8f0; padding: 15px; border-radius: 8px; margin: 10px 0; font-family: 'Courier New', monospace; }}
-                .highlight {{ background: #ffeaa7; padding: 2px 4px; border-radius: 3px; font-weight: bold; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1> Authentication Successful!</h1>
-                <div class="success">
-                    <p><strong>Welcome:</strong> {user_info.get('email', 'Unknown')}</p>
-                    <p><strong>Team Context:</strong> {selected_team}</p>
-                    <p><strong>Available Teams:</strong> {', '.join(available_teams)}</p>
-                </div>
-                
-                <div class="session-box">
-                    <p><strong> Your Session ID:</strong></p>
-                    <p style="font-family: monospace; word-break: break-all; margin: 10px 0;">
-                        <span id="sessionId">{session_id}</span>
-                        <button class="copy-btn" onclick="copySessionId()"> Copy</button>
-                    </p>
-                </div>
-                
-                <div class="info">
-                    <h3> Quick Commands</h3>
-                    <p><strong>Get your Vault token:</strong></p>
-                    <div class="command-box">
-curl -X POST http://localhost:8081/exchange \\<br>
-&nbsp;&nbsp;-H "Content-Type: application/json" \\<br>
-&nbsp;&nbsp;-d '{{"session_id": "{session_id}", "pipeline": "my-pipeline", "repo": "my-repo", "target": "my-target"}}'
-                    </div>
-                    <button class="copy-btn" onclick="copyCurlCommand()"> Copy curl command</button>
-                    
-                    <p><strong>Or use our CLI tool:</strong></p>
-                    <div class="command-box">
-./tools/bazel-auth-simple --session-id {session_id}
-                    </div>
-                    <button class="copy-btn" onclick="copyCLICommand()"> Copy CLI command</button>
-                </div>
-                
-                <div class="info">
-                    <h3> Token Exchange Payload</h3>
-                    <p>You can customize the metadata for your specific use case:</p>
-                    <pre id="jsonPayload">{{
-  "session_id": "{session_id}",
-  "pipeline": "your-pipeline",
-  "repo": "your-repo",
-  "target": "your-target"
-}}</pre>
-                    <button class="copy-btn" onclick="copyJSON()"> Copy JSON</button>
-                </div>
-                
-                <div style="text-align: center; margin-top: 30px;">
-                    <a href="/" style="color: #007cba; text-decoration: none;">← Back to Home</a>
-                </div>
-            </div>
-            
-            <script>
-                function copySessionId() {{
-                    const sessionId = document.getElementById('sessionId').innerText;
-                    navigator.clipboard.writeText(sessionId).then(() => {{
-                        const btn = event.target;
-                        btn.textContent = ' Copied!';
-                        btn.classList.add('copied');
-                        setTimeout(() => {{
-                            btn.textContent = ' Copy';
-                            btn.classList.remove('copied');
-                        }}, 2000);
-                    }});
-                }}
-                
-                function copyCurlCommand() {{
-                    const curlCmd = `curl -X POST http://localhost:8081/exchange \\
-  -H "Content-Type: application/json" \\
-  -d '{{"session_id": "{session_id}", "pipeline": "my-pipeline", "repo": "my-repo", "target": "my-target"}}'`;
-                    navigator.clipboard.writeText(curlCmd).then(() => {{
-                        const btn = event.target;
-                        btn.textContent = ' Copied!';
-                        btn.classList.add('copied');
-                        setTimeout(() => {{
-                            btn.textContent = ' Copy curl command';
-                            btn.classList.remove('copied');
-                        }}, 2000);
-                    }});
-                }}
-                
-                function copyCLICommand() {{
-                    const cliCmd = `./tools/bazel-auth-simple --session-id {session_id}`;
-                    navigator.clipboard.writeText(cliCmd).then(() => {{
-                        const btn = event.target;
-                        btn.textContent = ' Copied!';
-                        btn.classList.add('copied');
-                        setTimeout(() => {{
-                            btn.textContent = ' Copy CLI command';
-                            btn.classList.remove('copied');
-                        }}, 2000);
-                    }});
-                }}
-                
-                function copyJSON() {{
-                    const jsonText = document.getElementById('jsonPayload').innerText;
-                    navigator.clipboard.writeText(jsonText).then(() => {{
-                        const btn = event.target;
-                        btn.textContent = ' Copied!';
-                        btn.classList.add('copied');
-                        setTimeout(() => {{
-                            btn.textContent = ' Copy JSON';
-                            btn.classList.remove('copied');
-                        }}, 2000);
-                    }});
-                }}
-            </script>
-        </body>
-        </html>
-        """)
-
-@app.post("/exchange")
-async def exchange(req: Request):
-    """Exchange Okta session for a constrained child Vault token"""
-    body = await req.json()
-    session_id = body.get("session_id")
-    
-    if not session_id:
-        raise HTTPException(status_code=400, detail="session_id is required")
+        return _render_auth_success(
+            session_id,
+            user_info,
+            Markup("<p><strong>Team Context:</strong> {}</p><p><strong>Available Teams:</strong> {}</p>").format(
+                selected_team, ", ".join(available_teams)
+            )
+        )
+
+async def parse_exchange_request(req: Request) -> ExchangeRequest:
+    """
+    Dependency decoding the /exchange body straight from bytes.
     
-    if session_id not in _user_sessions:
+    Pydantic's Rust JSON parser validates in one pass, replacing FastAPI's
+    stdlib json.loads + content-type sniffing + model validation. Errors keep
+    FastAPI's standard 422 shape.
+    """
+    try:
+        return ExchangeRequest.model_validate_json(await req.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+@app.post("/exchange", openapi_extra={
+    "requestBody": {"required": True, "content": {"application/json": {"schema": ExchangeRequest.model_json_schema()}}}
+})
+async def exchange(body: ExchangeRequest = Depends(parse_exchange_request), vault: httpx.AsyncClient = Depends(get_vault_client)):
+    """Exchange Okta session for a constrained child Vault token"""
+    now = time.time()
+    session_id = body.session_id
+    session = await load_session(session_id, UserSession, now)
+    if session is None:
         raise HTTPException(status_code=401, detail="Invalid or expired session")
     
-    session = _user_sessions[session_id]
-    if time.time() > session["expires_at"]:
-        del _user_sessions[session_id]
-        raise HTTPException(status_code=401, detail="Session expired")
-    
-    parent_token = session["vault_token"]
-    user_info = session["user_info"]
-    selected_team = session.get("selected_team", "unknown")
+    parent_token = session.vault_token
+    user_info = session.user_info
+    selected_team = session.selected_team
     
-    # Create child token with user metadata and selected team
-    return await create_child_token(parent_token, user_info, body, selected_team)
+    # Create child token with user metadata and selected team. Returning an explicit
+    # response skips FastAPI's jsonable_encoder walk over the dict (orjson encodes it directly).
+    return ORJSONResponse(await create_child_token(vault, parent_token, user_info, body, selected_team, session_id=session_id, now=now))
 
 @app.post("/cli/start")
 async def cli_auth_start():
     """Start Authorization Code Flow with PKCE for CLI/Bazel authentication"""
     pkce_data = await pkce_auth_start()
     
-    return JSONResponse({
+    return ORJSONResponse({
         "auth_url": pkce_data["auth_url"],
         "state": pkce_data["state"],
         "instructions": {
@@ -1282,10 +1648,21 @@ async def cli_auth_start():
         "note": "This uses your existing redirect URI - you'll get a session_id directly from the callback"
     })
 
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "auth_method": "okta_oidc", "flows": ["authorization_code", "cli_pkce"]})
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "auth_method": "okta_oidc", "flows": ["authorization_code", "cli_pkce"]}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
+
+@app.get("/.well-known/jwks.json")
+async def jwks(request: Request):
+    """Public keys verifying broker-issued team JWTs (pre-serialized; honours If-None-Match)"""
+    headers = {"ETag": _JWKS_ETAG, "Cache-Control": "public, max-age=300"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, _JWKS_ETAG):
+        return Response(status_code=304, headers=headers)
+    return Response(content=_JWKS_BODY, media_type="application/json", headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
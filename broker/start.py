@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 """
 Simple startup script for the broker application.
+
+Runs on uvloop + httptools like the container. Set DEV=1 for auto-reload while
+editing; WEB_CONCURRENCY sets the worker count (see docs/SETUP.md).
 """
 import uvicorn
 import os
+import sys
 
 if __name__ == "__main__":
     # Ensure we're in the broker directory where the keys are located
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    
-    # Start the uvicorn server
-    uvicorn.run("app:app", host="0.0.0.0", port=8081, reload=True)
\ No newline at end of file
+
+    # Start the uvicorn server (uvloop is not available on Windows)
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=8081,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        reload=os.getenv("DEV") == "1",
+    )
@@ -0,0 +1,54 @@
+function showCopied(button) {
+    const originalText = button.textContent;
+    button.textContent = ' Copied!';
+    button.classList.add('copied');
+    setTimeout(() => {
+        button.textContent = originalText;
+        button.classList.remove('copied');
+    }, 2000);
+}
+
+function copyToClipboard(text, button) {
+    navigator.clipboard.writeText(text).then(function() {
+        showCopied(button);
+    }).catch(function() {
+        // Fallback for older browsers
+        const textArea = document.createElement('textarea');
+        textArea.value = text;
+        document.body.appendChild(textArea);
+        textArea.select();
+        document.execCommand('copy');
+        document.body.removeChild(textArea);
+        showCopied(button);
+    });
+}
+
+// Commands built from the session id for buttons with data-copy-command
+const COPY_COMMANDS = {
+    curl: sessionId => `curl -X POST http://localhost:8081/exchange \\
+  -H "Content-Type: application/json" \\
+  -d '{"session_id": "${sessionId}", "pipeline": "my-pipeline", "repo": "my-repo", "target": "my-target"}'`,
+    cli: sessionId => `./tools/bazel-auth-simple --session-id ${sessionId}`,
+};
+
+// One delegated handler for every copy button: data-copy names the element whose
+// text is copied, data-copy-command names an entry in COPY_COMMANDS
+document.addEventListener('click', function(event) {
+    const button = event.target.closest('.copy-btn');
+    if (!button) {
+        return;
+    }
+    const command = COPY_COMMANDS[button.dataset.copyCommand];
+    const text = command
+        ? command(document.getElementById('sessionId').textContent)
+        : document.querySelector(button.dataset.copy).textContent;
+    copyToClipboard(text, button);
+});
+
+// Auto-copy session ID to clipboard on page load
+window.addEventListener('load', function() {
+    const sessionId = document.getElementById('sessionId').textContent;
+    navigator.clipboard.writeText(sessionId).catch(() => {
+        // Silently fail if clipboard API not available
+    });
+});
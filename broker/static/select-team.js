@@ -0,0 +1,9 @@
+const form = document.getElementById('teamForm');
+const submitBtn = document.getElementById('submitBtn');
+const radioButtons = document.querySelectorAll('input[name="selected_team"]');
+
+radioButtons.forEach(radio => {
+    radio.addEventListener('change', () => {
+        submitBtn.disabled = false;
+    });
+});
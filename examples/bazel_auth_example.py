@@ -88,7 +88,10 @@ async def authenticate_for_bazel_build(pipeline="bazel-build", repo="example-rep
                 print(f"   - Team: {token_data['metadata']['team']}")
                 print(f"   - Policies: {', '.join(token_data['policies'])}")
                 print(f"   - TTL: {token_data['ttl']}s")
-                print(f"   - Uses: {token_data['uses_remaining']}")
+                if token_data.get("shared"):
+                    print("   - Uses: shared with a recent identical request")
+                else:
+                    print(f"   - Uses: {token_data['uses_remaining']}")
                 
                 # Return token for Bazel to use
                 return {
@@ -1,11 +1,19 @@
 #!/bin/bash
 
 # JWT Key Pair Generation Script
-# This script generates RSA key pairs for JWT signing and verification
+# This script generates key pairs for JWT signing and verification.
+# Ed25519 by default (fast EdDSA signatures, 32-byte keys); set JWT_KEY_TYPE=rsa
+# for a 2048-bit RSA key (RS256) instead. The broker picks the algorithm from the key.
 
 set -e
 
-echo "Generating RSA key pair for JWT signing..."
+JWT_KEY_TYPE="${JWT_KEY_TYPE:-ed25519}"
+case "$JWT_KEY_TYPE" in
+    ed25519|rsa) ;;
+    *) echo "Error: JWT_KEY_TYPE must be 'ed25519' or 'rsa' (got '$JWT_KEY_TYPE')"; exit 1 ;;
+esac
+
+echo "Generating ${JWT_KEY_TYPE} key pair for JWT signing..."
 
 # Create broker directory if it doesn't exist
 mkdir -p broker
@@ -30,13 +38,17 @@ if [[ -f "broker/jwt_signing_key" ]]; then
     echo "Backup created with timestamp: ${timestamp}"
 fi
 
-# Generate RSA private key (2048-bit)
+# Generate private key (Ed25519, or 2048-bit RSA)
 echo "   Generating private key..."
-openssl genrsa -out broker/jwt_signing_key 2048
+if [[ "$JWT_KEY_TYPE" == "rsa" ]]; then
+    openssl genrsa -out broker/jwt_signing_key 2048
+else
+    openssl genpkey -algorithm ed25519 -out broker/jwt_signing_key
+fi
 
-# Generate RSA public key
+# Generate public key
 echo "   Generating public key..."
-openssl rsa -in broker/jwt_signing_key -pubout -out broker/jwt_signing_key.pub
+openssl pkey -in broker/jwt_signing_key -pubout -out broker/jwt_signing_key.pub
 
 # Generate PEM format public key (alternative format)
 echo "   Generating PEM format public key..."
@@ -47,7 +59,7 @@ chmod 600 broker/jwt_signing_key        # Private key - restrict access
 chmod 644 broker/jwt_signing_key.pub    # Public key - readable
 chmod 644 broker/jwt_public_key.pem     # Public key - readable
 
-echo "RSA key pair generated successfully:"
+echo "${JWT_KEY_TYPE} key pair generated successfully:"
 echo "Private key: broker/jwt_signing_key"
 echo "Public key:  broker/jwt_signing_key.pub"
 echo "PEM format:  broker/jwt_public_key.pem"
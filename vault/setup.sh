@@ -5,7 +5,7 @@
 # with team-based entity isolation for Bazel builds.
 #
 # Architecture Overview:
-# - Authentication Broker: Generates team-based JWT tokens with RSA signing
+# - Authentication Broker: Generates team-based JWT tokens signed with EdDSA (Ed25519) or RS256 (RSA)
 # - Vault JWT Auth: Validates broker-generated tokens using public key
 # - Team Entities: One entity per team for stable aliases and shared access
 # - User Context: Multi-team users select context via broker interface
@@ -290,7 +290,7 @@ echo " Configuring broker-based JWT authentication..."
 vault auth enable jwt 2>/dev/null || echo "JWT auth method already enabled"
 
 # Configure JWT auth to use broker's public key for token verification
-# The broker generates RSA-signed JWTs with team names as subjects
+# The broker generates EdDSA (Ed25519 key) or RS256 (RSA key) signed JWTs with team names as subjects
 
 # Get the path to the JWT public key
 JWT_PUBLIC_KEY_PATH=""
@@ -306,6 +306,7 @@ fi
 echo "Using JWT public key from: $JWT_PUBLIC_KEY_PATH"
 vault write auth/jwt/config \
   bound_issuer="bazel-auth-broker" \
+  jwt_supported_algs="EdDSA,RS256" \
   jwt_validation_pubkeys=@${JWT_PUBLIC_KEY_PATH}
 
 # 5) Create team-specific JWT roles
@@ -466,7 +467,7 @@ echo " Vault setup complete for broker-based JWT authentication!"
 echo ""
 echo " Configuration Summary:"
 echo "   Auth Method: Broker-generated JWT tokens"
-echo "   Token Signing: RSA 2048-bit key pair (broker-managed)"
+echo "   Token Signing: Ed25519 (EdDSA) or RSA 2048-bit (RS256) key pair (broker-managed)"
 echo "   User Authentication: Okta OIDC (via broker)"
 echo "   Entity Management: Team-based with stable aliases"
 echo ""
@@ -492,7 +493,7 @@ echo "   kv/dev/frontend/* - Frontend team only"
 echo ""
 echo " Next Steps:"
 echo "  1. Deploy authentication broker with:"
-echo "     - RSA key pair for JWT signing"
+echo "     - Ed25519 or RSA key pair for JWT signing"
 echo "     - Okta OIDC configuration"
 echo "     - Team context selection interface"
 echo "  2. Configure Okta app with broker redirect URIs"